@@ -1,6 +1,47 @@
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+
 from django.apps import AppConfig
+from django.conf import settings
+
+# Listener draining general_logger's queue in the current process
+_log_listener = None
+
+
+def _start_log_listener(logger, handlers):
+    """Route logger through a fresh queue drained by a listener thread in this process"""
+    global _log_listener
+    if _log_listener is not None:
+        atexit.unregister(_log_listener.stop)
+
+    log_queue = queue.SimpleQueue()
+    _log_listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    logger.handlers = [logging.handlers.QueueHandler(log_queue)]
+    _log_listener.start()
+    atexit.register(_log_listener.stop)
 
 
 class SplitterConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'splitter'
+
+    def ready(self):
+        # Create the upload spool directory once per process, not on every settings import
+        temp_dir = settings.FILE_UPLOAD_TEMP_DIR
+        if temp_dir and not os.path.isdir(temp_dir):
+            os.makedirs(temp_dir, exist_ok=True)
+
+        # Hand general_logger's handlers to a background listener thread so
+        # request threads only enqueue records instead of writing to stdout
+        logger = logging.getLogger("general_logger")
+        if not logger.handlers or any(isinstance(h, logging.handlers.QueueHandler) for h in logger.handlers):
+            return
+
+        handlers = list(logger.handlers)
+        _start_log_listener(logger, handlers)
+        # Forked children (Celery's prefork pool) don't inherit the listener thread,
+        # so each one starts its own instead of filling a queue nobody drains
+        os.register_at_fork(after_in_child=lambda: _start_log_listener(logger, handlers))
@@ -0,0 +1,212 @@
+from celery import shared_task
+from django.conf import settings
+
+import logging
+import orjson
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .utils import get_s3_client
+
+logger = logging.getLogger("general_logger")
+
+# Beam holds the request open while it splits; connecting should be quick
+BEAM_CONNECT_TIMEOUT = 10
+BEAM_READ_TIMEOUT = 300  # 5 minutes
+BEAM_CONNECT_RETRIES = 1
+
+# Worst case is every connect attempt timing out before one request runs the full
+# read timeout; leave a minute of headroom on top
+BEAM_TASK_TIME_LIMIT = (BEAM_CONNECT_RETRIES + 1) * BEAM_CONNECT_TIMEOUT + BEAM_READ_TIMEOUT + 60
+
+# Shared HTTP session for Beam API calls so keep-alive connections are reused.
+# Only failed connects are retried, since Beam never saw those requests. Once the POST
+# is sent, a read timeout or gateway error can mean the split is still running, and
+# resending it would start a duplicate job.
+_BEAM_SESSION = requests.Session()
+_beam_adapter = HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=64,
+    max_retries=Retry(
+        total=BEAM_CONNECT_RETRIES,
+        connect=BEAM_CONNECT_RETRIES,
+        read=False,
+        backoff_factor=0.5
+    )
+)
+_BEAM_SESSION.mount('https://', _beam_adapter)
+_BEAM_SESSION.mount('http://', _beam_adapter)
+
+
+# Beam only returns stem metadata; anything larger than this is treated as a bad response
+BEAM_MAX_RESPONSE_BYTES = 1024 * 1024  # 1MB
+
+
+def _read_capped(response, limit=BEAM_MAX_RESPONSE_BYTES):
+    """Read a streamed response body, giving up once it exceeds limit bytes"""
+    body = bytearray()
+    for chunk in response.iter_content(chunk_size=64 * 1024):
+        body += chunk
+        if len(body) > limit:
+            return None
+    return bytes(body)
+
+
+# DeleteObjects accepts at most this many keys per request
+S3_DELETE_BATCH_SIZE = 1000
+
+
+def _split_error(error_message):
+    return {'status': 'error', 'error_message': error_message}
+
+
+def _schedule_upload_cleanup(upload_key):
+    """Queue deletion of the original upload once Beam has produced the stems"""
+    if upload_key:
+        cleanup_s3_keys.apply_async(args=[[upload_key]], countdown=5)
+
+
+@shared_task(bind=True, time_limit=BEAM_TASK_TIME_LIMIT)
+def run_split(self, file_name, upload_key=None):
+    """Send a split request to the Beam API and return the resulting stem info.
+
+    upload_key is the session's own upload, deleted once the split succeeds.
+    """
+    logger.info("Processing split task %s for file: %s", self.request.id, file_name)
+
+    # Prepare request to Beam API
+    headers = {
+        'Authorization': f"Bearer {settings.BEAM_API_TOKEN}",
+        'Content-Type': 'application/json',
+        'Accept': 'application/json'
+    }
+
+    payload = {'file_name': file_name}
+    logger.info("Sending request to Beam API at %s", settings.BEAM_API_URL)
+    logger.info("Request payload: %s", payload)
+
+    # Make the API request with timeout
+    try:
+        response = _BEAM_SESSION.post(
+            settings.BEAM_API_URL,
+            headers=headers,
+            data=orjson.dumps(payload),
+            timeout=(BEAM_CONNECT_TIMEOUT, BEAM_READ_TIMEOUT),
+            stream=True
+        )
+    except requests.exceptions.Timeout:
+        logger.error("Beam API request timed out after %d seconds", BEAM_READ_TIMEOUT)
+        return _split_error("Processing timed out. Please try again or use a smaller file.")
+    except requests.exceptions.ConnectionError:
+        logger.error("Connection error to Beam API at %s", settings.BEAM_API_URL)
+        return _split_error("Could not connect to processing service. Please try again later.")
+    except requests.exceptions.RequestException as e:
+        logger.exception("Request to Beam API failed: %s", e)
+        return _split_error("Error communicating with processing service.")
+
+    # Process the API response
+    logger.info("Beam API response status code: %s", response.status_code)
+
+    try:
+        with response:
+            body = _read_capped(response)
+    except requests.exceptions.RequestException as e:
+        logger.exception("Reading Beam API response failed: %s", e)
+        return _split_error("Error communicating with processing service.")
+
+    if body is None:
+        logger.error("Beam API response exceeded %d bytes", BEAM_MAX_RESPONSE_BYTES)
+        return _split_error("Invalid response from processing service")
+
+    # For non-200 responses, try to extract meaningful error information
+    if response.status_code != 200:
+        try:
+            error_content = orjson.loads(body)
+            logger.error("Beam API error response: %s", error_content)
+            return _split_error(f"Processing service error: {error_content.get('error', 'Unknown error')}")
+        except orjson.JSONDecodeError:
+            # Not JSON or other parsing error
+            logger.error("Beam API non-JSON error response: %r", body[:1000])
+            return _split_error(f"Processing service error (Status: {response.status_code})")
+
+    # Handle successful response
+    try:
+        result = orjson.loads(body)
+    except orjson.JSONDecodeError:
+        logger.error("Could not parse Beam API JSON response: %r", body[:1000])
+        return _split_error("Invalid response from processing service")
+
+    logger.info("Successfully processed file. Result: %s", result)
+
+    # New format with base_name and stem_files
+    if 'base_name' in result and 'stem_files' in result:
+        _schedule_upload_cleanup(upload_key)
+        return {
+            'status': 'success',
+            'base_name': result['base_name'],
+            'stem_files': result['stem_files']
+        }
+
+    # Old format with just a zip file
+    if 'file_name' in result:
+        if result['file_name'] != upload_key:
+            _schedule_upload_cleanup(upload_key)
+        return {
+            'status': 'success',
+            'file_name': result['file_name']
+        }
+
+    logger.error("Invalid response format from Beam API: %s", result)
+    return _split_error("Invalid response from processing service")
+
+
+@shared_task(bind=True, ignore_result=True, max_retries=3, default_retry_delay=30)
+def cleanup_s3_keys(self, s3_keys):
+    """Delete the given keys from the S3 bucket"""
+    # Imported here so loading the task module doesn't pull in botocore
+    from botocore.exceptions import BotoCoreError, ClientError
+
+    deleted_files = []
+    failed_files = []
+
+    if not s3_keys:
+        return {'deleted_files': deleted_files, 'failed_files': failed_files}
+
+    s3 = get_s3_client()
+    if s3 is None:
+        logger.error("S3 client not initialized, skipping cleanup of %d keys", len(s3_keys))
+        failed_files = [{'s3_key': s3_key, 'error': 'S3 client not initialized'} for s3_key in s3_keys]
+        return {'deleted_files': deleted_files, 'failed_files': failed_files}
+
+    logger.info("Batch deleting %d keys from S3", len(s3_keys))
+
+    # One DeleteObjects request removes up to 1000 keys; Quiet mode only reports failures
+    for start in range(0, len(s3_keys), S3_DELETE_BATCH_SIZE):
+        batch = s3_keys[start:start + S3_DELETE_BATCH_SIZE]
+        try:
+            response = s3.delete_objects(
+                Bucket=settings.S3_BUCKET_NAME,
+                Delete={'Objects': [{'Key': s3_key} for s3_key in batch], 'Quiet': True}
+            )
+        except (BotoCoreError, ClientError) as e:
+            # Deletes are idempotent, so retry the keys that haven't been handled yet
+            logger.warning("S3 cleanup failed, retrying: %s", e)
+            raise self.retry(exc=e, args=[s3_keys[start:]])
+
+        errors = response.get('Errors', [])
+        failed_keys = {error['Key'] for error in errors}
+        for error in errors:
+            logger.error("Error deleting %s from S3: %s", error['Key'], error.get('Message', ''))
+            failed_files.append({
+                's3_key': error['Key'],
+                'error': error.get('Message', '')
+            })
+
+        deleted_files.extend(s3_key for s3_key in batch if s3_key not in failed_keys)
+
+    logger.info("Batch delete complete: %d ok, %d err", len(deleted_files), len(failed_files))
+    return {
+        'deleted_files': deleted_files,
+        'failed_files': failed_files
+    }
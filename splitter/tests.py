@@ -1,3 +1,244 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+import orjson
+from botocore.exceptions import ClientError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from splitter_django.celery import app as celery_app
+
+from . import views
+from .tasks import cleanup_s3_keys, run_split
+
+STEM_FILES = [
+    {'s3_key': 'stems/song_drums.wav', 'file_name': 'song_drums.wav'},
+    {'s3_key': 'stems/song_bass.wav', 'file_name': 'song_bass.wav'},
+]
+
+_celery_conf = {}
+
+
+def setUpModule():
+    # Run tasks inline with an in-memory result backend (under the CELERY_ names the app
+    # reads from Django settings)
+    overrides = {
+        'CELERY_TASK_ALWAYS_EAGER': True,
+        'CELERY_RESULT_BACKEND': 'cache+memory://',
+    }
+    _celery_conf.update({name: celery_app.conf.get(name) for name in overrides})
+    celery_app.conf.update(overrides)
+    # Set on the task itself, which may have read task_store_eager_result already,
+    # so SplitStatus can read run_split's result back
+    run_split.store_eager_result = True
+
+
+def tearDownModule():
+    celery_app.conf.update(_celery_conf)
+    run_split.store_eager_result = False
+
+
+def _beam_response(status_code, body):
+    response = mock.MagicMock(status_code=status_code)
+    response.iter_content.return_value = [orjson.dumps(body)]
+    return response
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    SECURE_SSL_REDIRECT=False,
+    S3_BUCKET_NAME='test-bucket',
+    BEAM_API_URL='https://beam.test/split',
+    BEAM_API_TOKEN='test-token',
+)
+class SplitterTestCase(TestCase):
+    """Runs the views against a mocked S3 client and Beam session"""
+
+    def setUp(self):
+        self.s3 = mock.MagicMock()
+        self.s3.generate_presigned_url.side_effect = lambda op, Params, ExpiresIn: f"https://s3.test/{Params['Key']}"
+        self.s3.generate_presigned_post.side_effect = lambda Bucket, Key, **kwargs: {
+            'url': 'https://s3.test/', 'fields': {'key': Key}
+        }
+        self.s3.delete_objects.return_value = {}
+        for target in ('splitter.views.get_s3_client', 'splitter.tasks.get_s3_client'):
+            patcher = mock.patch(target, return_value=self.s3)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        patcher = mock.patch('splitter.tasks._BEAM_SESSION')
+        self.beam = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def deleted_keys(self):
+        """Every key passed to delete_objects, in call order"""
+        return [
+            obj['Key']
+            for call in self.s3.delete_objects.call_args_list
+            for obj in call.kwargs['Delete']['Objects']
+        ]
+
+    def upload(self, name='song.wav'):
+        return self.client.post(reverse('upload_audio'), {
+            'file': SimpleUploadedFile(name, b'RIFF0000WAVE', content_type='audio/wav')
+        })
+
+    def split(self):
+        self.client.post(reverse('split'))
+        return self.client.session['split_task']
+
+
+class SplitFlowTests(SplitterTestCase):
+    def test_upload_split_status_download_cleanup(self):
+        response = self.upload()
+        self.assertContains(response, 'Ready to process your file')
+        self.assertEqual(self.s3.upload_file.call_args.args[1:3], ('test-bucket', 'song.wav'))
+        self.assertEqual(self.client.session['uploaded_file'], 'song.wav')
+
+        self.beam.post.return_value = _beam_response(200, {'base_name': 'song', 'stem_files': STEM_FILES})
+        task_id = self.split()
+        self.assertEqual(orjson.loads(self.beam.post.call_args.kwargs['data']), {'file_name': 'song.wav'})
+
+        response = self.client.get(reverse('split_status', args=[task_id]))
+        self.assertContains(response, 'Splitting complete!')
+        session = self.client.session
+        self.assertEqual(session['stem_files'], STEM_FILES)
+        self.assertIn('stems:song', session)
+        self.assertNotIn('uploaded_file', session)
+        # The worker removed the original upload once Beam produced the stems
+        self.assertIn('song.wav', self.deleted_keys())
+
+        # The result is only handed out once
+        response = self.client.get(reverse('split_status', args=[task_id]))
+        self.assertContains(response, 'Split not found')
+
+        signed = self.s3.generate_presigned_url.call_count
+        response = self.client.post(reverse('download'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [url['url'] for url in orjson.loads(response.content)['download_urls']],
+            ['https://s3.test/stems/song_drums.wav', 'https://s3.test/stems/song_bass.wav']
+        )
+        # Served from the URLs signed when the split finished
+        self.assertEqual(self.s3.generate_presigned_url.call_count, signed)
+
+        self.s3.delete_objects.reset_mock()
+        response = self.client.post(reverse('cleanup_s3'))
+        self.assertEqual(orjson.loads(response.content)['status'], 'success')
+        self.assertEqual(self.deleted_keys(), ['stems/song_drums.wav', 'stems/song_bass.wav'])
+        session = self.client.session
+        for key in ('stem_files', 'base_name', 'stems:song', 'stems_delete_at'):
+            self.assertNotIn(key, session)
+
+    def test_direct_upload_only_confirms_the_issued_key(self):
+        response = self.client.post(reverse('get_upload_url'), {'file_name': 'song.wav'})
+        key = orjson.loads(response.content)['fields']['key']
+
+        response = self.client.post(reverse('confirm_upload'), {'file_name': 'other.wav'})
+        self.assertContains(response, 'Upload failed')
+        self.assertNotIn('uploaded_file', self.client.session)
+
+        response = self.client.post(reverse('confirm_upload'), {'file_name': key})
+        self.assertContains(response, 'Ready to process your file')
+        self.assertEqual(self.client.session['uploaded_file'], key)
+
+    def test_split_requires_an_upload_on_the_session(self):
+        response = self.client.post(reverse('split'), {'file_name': 'someone-elses.wav'})
+        self.assertContains(response, 'Please upload a file first')
+        self.beam.post.assert_not_called()
+
+    def test_failed_split_deletes_the_upload(self):
+        self.upload()
+        self.beam.post.return_value = _beam_response(500, {'error': 'boom'})
+        task_id = self.split()
+
+        response = self.client.get(reverse('split_status', args=[task_id]))
+        self.assertContains(response, 'Processing service error: boom')
+        self.assertEqual(self.deleted_keys(), ['song.wav'])
+        self.assertNotIn('uploaded_file', self.client.session)
+
+    def test_status_rejects_another_sessions_task(self):
+        self.upload()
+        self.beam.post.return_value = _beam_response(200, {'base_name': 'song', 'stem_files': STEM_FILES})
+        task_id = self.split()
+
+        response = Client().get(reverse('split_status', args=[task_id]))
+        self.assertContains(response, 'Split not found')
+
+        response = self.client.get(reverse('split_status', args=[task_id]))
+        self.assertContains(response, 'Splitting complete!')
+
+    def test_status_polling_gives_up(self):
+        session = self.client.session
+        session['split_task'] = 'never-queued'
+        session.save()
+        url = reverse('split_status', args=['never-queued'])
+
+        response = self.client.get(url)
+        self.assertContains(response, 'poll=1')
+
+        response = self.client.get(url, {'poll': views.SPLIT_MAX_POLLS})
+        self.assertContains(response, 'Processing timed out')
+        self.assertNotIn('split_task', self.client.session)
+
+    def test_download_after_cleanup_deadline(self):
+        self.upload()
+        self.beam.post.return_value = _beam_response(200, {'base_name': 'song', 'stem_files': STEM_FILES})
+        self.client.get(reverse('split_status', args=[self.split()]))
+
+        session = self.client.session
+        session['stems_delete_at'] = 0
+        session.save()
+        response = self.client.post(reverse('download'))
+        self.assertEqual(response.status_code, 410)
+        self.assertNotIn('stem_files', self.client.session)
+
+
+class UploadFileTests(SplitterTestCase):
+    @override_settings(MAX_UPLOAD_SIZE=1024 * 1024)
+    def test_rejects_large_upload_before_reading_it(self):
+        response = self.client.post(reverse('upload_audio'), {
+            'file': SimpleUploadedFile('song.wav', b'0' * (1024 * 1024 + 1), content_type='audio/wav')
+        })
+        self.assertContains(response, 'Maximum size is 1MB', status_code=413)
+        self.s3.upload_file.assert_not_called()
+
+    def test_csrf_is_enforced(self):
+        client = Client(enforce_csrf_checks=True)
+        response = client.post(reverse('upload_audio'), {
+            'file': SimpleUploadedFile('song.wav', b'RIFF0000WAVE', content_type='audio/wav')
+        })
+        self.assertEqual(response.status_code, 403)
+        self.s3.upload_file.assert_not_called()
+
+
+class CleanupS3KeysTests(SplitterTestCase):
+    def test_deletes_in_batches(self):
+        keys = [f'stems/{i}.wav' for i in range(2500)]
+        self.s3.delete_objects.side_effect = [
+            {},
+            {'Errors': [{'Key': 'stems/1500.wav', 'Message': 'Access Denied'}]},
+            {},
+        ]
+
+        result = cleanup_s3_keys.apply(args=[keys]).get()
+
+        batch_sizes = [len(call.kwargs['Delete']['Objects']) for call in self.s3.delete_objects.call_args_list]
+        self.assertEqual(batch_sizes, [1000, 1000, 500])
+        self.assertEqual(len(result['deleted_files']), 2499)
+        self.assertEqual(result['failed_files'], [{'s3_key': 'stems/1500.wav', 'error': 'Access Denied'}])
+
+    def test_retries_remaining_keys(self):
+        keys = [f'stems/{i}.wav' for i in range(1500)]
+        error = ClientError({'Error': {'Code': 'SlowDown', 'Message': 'Slow Down'}}, 'DeleteObjects')
+        self.s3.delete_objects.side_effect = [{}, error, {}]
+
+        cleanup_s3_keys.apply(args=[keys])
+
+        # The retry starts from the failed batch, not from the beginning
+        self.assertEqual(self.deleted_keys(), keys + keys[1000:])
+
+    def test_skips_without_s3_client(self):
+        with mock.patch('splitter.tasks.get_s3_client', return_value=None):
+            result = cleanup_s3_keys.apply(args=[['stems/a.wav']]).get()
+        self.assertEqual(result['failed_files'], [{'s3_key': 'stems/a.wav', 'error': 'S3 client not initialized'}])
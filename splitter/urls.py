@@ -6,7 +6,10 @@ urlpatterns = [
     path("", views.HomePage.as_view(), name="home"),
     path("setting/", views.SettingsPage.as_view(), name="setting"),
     path("split/", views.SplitFile.as_view(), name="split"),
+    path("split/status/<str:task_id>/", views.SplitStatus.as_view(), name="split_status"),
     path("upload_audio/", views.UploadFile.as_view(), name="upload_audio"),
+    path("upload_url/", views.GetUploadURL.as_view(), name="get_upload_url"),
+    path("confirm_upload/", views.ConfirmUpload.as_view(), name="confirm_upload"),
     path("validate_keygen/", views.ValidateKeygen.as_view(), name="validate_keygen"),
     path("download/", views.DownloadFile.as_view(), name="download"),
     path("cleanup_s3/", views.CleanupS3View.as_view(), name="cleanup_s3"),
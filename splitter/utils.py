@@ -1,9 +1,13 @@
 import os
 from django.conf import settings
+from django.core.cache import cache
 import requests
-import json
+import orjson
 import logging
 import hashlib
+import threading
+import time
+from functools import lru_cache
 from datetime import datetime, timedelta
 
 logger = logging.getLogger("general_logger")
@@ -11,6 +15,68 @@ logger = logging.getLogger("general_logger")
 # Constants for session management
 LICENSE_SESSION_KEY = 'validated_license'
 LICENSE_EXPIRY_HOURS = 24
+# How long a Keygen verdict is reused for the same key
+KEYGEN_CACHE_SECONDS = 300
+
+# Shared HTTP session so repeat Keygen validations reuse the TLS connection
+_KEYGEN_SESSION = requests.Session()
+
+# Process-wide S3 client, built on first use so boto3 stays off the startup path
+_S3_CLIENT = None
+_S3_LOCK = threading.Lock()
+
+
+def _create_s3_client():
+    """Build the S3 client shared by every thread in the process"""
+    try:
+        import boto3
+        from botocore.config import Config
+        session = boto3.Session(
+            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+            region_name=settings.AWS_REGION
+        )
+        client = session.client(
+            's3',
+            config=Config(
+                max_pool_connections=64,  # room for concurrent transfers across threads
+                connect_timeout=5,
+                read_timeout=30,
+                # Bounded retries; adaptive mode backs off on S3 503 SlowDown
+                retries={'max_attempts': 4, 'mode': 'adaptive'},
+                tcp_keepalive=True,
+                signature_version='s3v4',
+                s3={'use_accelerate_endpoint': settings.S3_USE_ACCELERATE, 'addressing_style': 'virtual'}
+            )
+        )
+        logger.info("Successfully initialized S3 client")
+        return client
+    except Exception as e:
+        logger.error("Error initializing S3 client: %s", e)
+        return None
+
+
+def get_s3_client():
+    """Return the shared S3 client, or None when AWS credentials aren't configured"""
+    global _S3_CLIENT
+    if _S3_CLIENT is None and settings.AWS_ACCESS_KEY_ID and settings.AWS_SECRET_ACCESS_KEY:
+        # Double-checked so concurrent first requests don't each build a client
+        with _S3_LOCK:
+            if _S3_CLIENT is None:
+                _S3_CLIENT = _create_s3_client()
+    return _S3_CLIENT
+
+
+@lru_cache(maxsize=None)
+def get_transfer_config():
+    """Multipart settings shared by every server-side upload, built on first use like the client"""
+    from boto3.s3.transfer import TransferConfig
+    return TransferConfig(
+        multipart_threshold=8 * 1024 * 1024,  # 8MB
+        multipart_chunksize=16 * 1024 * 1024,  # 16MB
+        max_concurrency=10,
+        use_threads=True
+    )
 
 
 def get_license_hash(key):
@@ -22,25 +88,32 @@ def get_license_hash(key):
 
 def check_key(key):
     """Validate a license key against the Keygen API"""
+    # Repeat submissions of the same key reuse the last verdict (keyed by hash, never the raw key)
+    cache_key = f"keygen:{hashlib.sha256(key.encode()).hexdigest()}"
+    cached = cache.get(cache_key)
+    if cached is not None:
+        logger.info("Using cached license validation result: %s", cached)
+        return cached
+
     # Debug logging
-    logger.info(f"Starting key validation with KEYGEN_ACCOUNT_ID: {settings.KEYGEN_ACCOUNT_ID}")
-    logger.info(f"Key being validated: {key}")
+    logger.info("Starting key validation with KEYGEN_ACCOUNT_ID: %s", settings.KEYGEN_ACCOUNT_ID)
+    logger.info("Key being validated: %s", key)
 
     # Construct API endpoint
     api_endpoint = f"https://api.keygen.sh/v1/accounts/{settings.KEYGEN_ACCOUNT_ID}/licenses/actions/validate-key"
-    logger.info(f"API endpoint: {api_endpoint}")
+    logger.info("API endpoint: %s", api_endpoint)
 
     # Prepare request data
-    request_data = json.dumps({
+    request_data = orjson.dumps({
         "meta": {
             "key": key
         }
     })
-    logger.info(f"Request payload: {request_data}")
+    logger.info("Request payload: %s", request_data.decode())
 
     # Make the API request
     try:
-        response = requests.post(
+        response = _KEYGEN_SESSION.post(
             api_endpoint,
             headers={
                 "Content-Type": "application/vnd.api+json",
@@ -50,23 +123,26 @@ def check_key(key):
         )
 
         # Log response details
-        logger.info(f"Response status code: {response.status_code}")
-        logger.info(f"Response content: {response.text[:200]}...")  # Log first 200 chars
+        logger.info("Response status code: %s", response.status_code)
+        logger.info("Response content: %s...", response.text[:200])  # Log first 200 chars
 
-        validation = response.json()
+        validation = orjson.loads(response.content)
     except Exception as e:
-        logger.error(f"Exception during API request: {str(e)}")
+        logger.exception("Exception during API request: %s", e)
         return False
 
     if "errors" in validation:
         errs = validation["errors"]
 
         error_messages = '\n'.join(map(lambda e: "{} - {}".format(e["title"], e["detail"]).lower(), errs))
-        logger.info(f"License validation failed: {error_messages}")
+        logger.info("License validation failed: %s", error_messages)
         return False
 
     valid = validation["meta"]["valid"]
-    logger.info(f"License validation result: {valid}")
+    logger.info("License validation result: %s", valid)
+    # Only a real verdict is cached; auth, rate-limit and server errors are retried next time
+    if response.ok:
+        cache.set(cache_key, valid, KEYGEN_CACHE_SECONDS)
 
     return valid
 
@@ -81,10 +157,13 @@ def store_license_in_session(request, license_key):
         # Store in session with expiry information
         request.session[LICENSE_SESSION_KEY] = {
             'hash': license_hash,
-            'expires': (datetime.now() + timedelta(hours=LICENSE_EXPIRY_HOURS)).isoformat()
+            'expires': (datetime.now() + timedelta(hours=LICENSE_EXPIRY_HOURS)).isoformat(),
+            # Epoch timestamp for the fast path in is_license_valid
+            'valid_until': time.time() + LICENSE_EXPIRY_HOURS * 3600
         }
         # Ensure session doesn't expire with browser close
         request.session.set_expiry(LICENSE_EXPIRY_HOURS * 3600)  # in seconds
+        request._license_valid = True
         logger.info("License stored in session")
 
         return True
@@ -94,11 +173,24 @@ def store_license_in_session(request, license_key):
 
 
 def is_license_valid(request):
-    """Check if a valid license exists in the session"""
+    """Check if a valid license exists in the session, memoized for the request"""
+    cached = getattr(request, '_license_valid', None)
+    if cached is None:
+        cached = request._license_valid = _check_license_session(request)
+    return cached
+
+
+def _check_license_session(request):
+    """Read and validate the license data stored in the session"""
     # Try to get from session
     if hasattr(request, 'session') and LICENSE_SESSION_KEY in request.session:
         license_data = request.session[LICENSE_SESSION_KEY]
 
+        # Fast path: compare the stored timestamp without parsing a date string
+        valid_until = license_data.get('valid_until')
+        if valid_until is not None and time.time() < valid_until:
+            return True
+
         # Check if license has expired
         try:
             expiry = datetime.fromisoformat(license_data['expires'])
@@ -110,7 +202,7 @@ def is_license_valid(request):
                 # Clean up expired session data
                 del request.session[LICENSE_SESSION_KEY]
         except (ValueError, KeyError) as e:
-            logger.error(f"Error parsing license data from session: {str(e)}")
+            logger.error("Error parsing license data from session: %s", e)
             # Session data is malformed, remove it
             del request.session[LICENSE_SESSION_KEY]
 
@@ -123,6 +215,7 @@ def clear_license(request):
     # Clear from session
     if hasattr(request, 'session') and LICENSE_SESSION_KEY in request.session:
         del request.session[LICENSE_SESSION_KEY]
+    request._license_valid = False
 
     logger.info("License data cleared")
     return
\ No newline at end of file
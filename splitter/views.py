@@ -1,43 +1,112 @@
 from django.shortcuts import render, HttpResponse, redirect
 from django.views.generic import TemplateView
 from django.conf import settings
-from .utils import check_key, is_license_valid, store_license_in_session, clear_license
+from .utils import (
+    check_key, is_license_valid, store_license_in_session, clear_license, get_s3_client, get_transfer_config
+)
+from .tasks import run_split, cleanup_s3_keys, BEAM_TASK_TIME_LIMIT
 from django.urls import reverse  # Add this import
+from django.template.loader import get_template
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
 
-from django.http import JsonResponse
-from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
 from django.utils.decorators import method_decorator
 from django.views import View
 
-import json
+import time
+import orjson
 
-import base64
-import boto3
 import os
 import logging
-import requests
-import io
-import traceback
 
 logger = logging.getLogger("general_logger")
 
-S3_EXTENSIONS = (".aif", ".mp3", ".flac", ".wav")
+_EXT_SET = frozenset((".aif", ".aiff", ".mp3", ".flac", ".wav"))
 
+# Content types stored on uploaded audio objects (both upload paths)
+AUDIO_CONTENT_TYPES = {
+    ".aif": "audio/aiff",
+    ".aiff": "audio/aiff",
+    ".mp3": "audio/mpeg",
+    ".flac": "audio/flac",
+    ".wav": "audio/wav",
+}
 
-def deserialize_zip_file(path, base64_encoded_content):
-    try:
-        downloads_dir = os.path.join(settings.MEDIA_ROOT, "downloads")
-        os.makedirs(downloads_dir, exist_ok=True)
 
-        zip_file_path = os.path.join(downloads_dir, path)
-        with open(zip_file_path, 'wb') as f:
-            f.write(base64.b64decode(base64_encoded_content))
-        logger.info(f"Deserialized zip to {zip_file_path}")
-        return True
-    except Exception as e:
-        logger.error(f"Deserialization failed: {e}")
-        logger.error(traceback.format_exc())
-        return False
+def _upload_key(file_name):
+    """S3 key for a new upload: the bare file name, which Beam derives the stem names from"""
+    return os.path.basename(file_name)
+
+
+class OrjsonResponse(HttpResponse):
+    """JSON response serialized with orjson"""
+
+    def __init__(self, data, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(orjson.dumps(data), **kwargs)
+
+
+def _render_partial(request, context):
+    """Render the upload/split partial; the cached template loader keeps it parsed between calls"""
+    return HttpResponse(get_template('partials/file_upload_split.html').render(context, request))
+
+
+# The processing partial polls SplitStatus this often, and gives up a little after
+# run_split's own time limit, when the task can no longer be running
+SPLIT_POLL_SECONDS = 3
+SPLIT_MAX_POLLS = BEAM_TASK_TIME_LIMIT // SPLIT_POLL_SECONDS + 20
+
+# Presigned download URLs live 5 minutes; cached ones are reused until the last minute
+PRESIGN_EXPIRES = 300
+PRESIGN_REFRESH_MARGIN = 60
+# Stems are deleted this long after the split finishes, in case the browser never calls cleanup
+STEM_RETENTION_SECONDS = 3600  # 1 hour
+
+
+def _presign_stems(stem_files):
+    """Generate a presigned download URL for each stem file"""
+    s3 = get_s3_client()
+    download_urls = []
+    for stem_file in stem_files:
+        s3_key = stem_file["s3_key"]
+        file_name = stem_file["file_name"]
+
+        try:
+            presigned_url = s3.generate_presigned_url(
+                'get_object',
+                Params={
+                    'Bucket': settings.S3_BUCKET_NAME,
+                    'Key': s3_key,
+                    'ResponseContentDisposition': f'attachment; filename="{file_name}"'
+                },
+                ExpiresIn=PRESIGN_EXPIRES
+            )
+            download_urls.append({
+                'url': presigned_url,
+                'filename': file_name
+            })
+
+        except Exception as e:
+            logger.error("Error generating presigned URL for %s: %s", s3_key, e)
+            # Continue even if one URL generation fails
+            download_urls.append({
+                'url': None,
+                'filename': file_name,
+                'error': str(e)
+            })
+
+    logger.info("Generated %d presigned URLs", len(download_urls))
+    return download_urls
+
+
+def _cache_stem_urls(request, base_name, stem_files):
+    """Sign the stems and keep the URLs on the session for the download step"""
+    download_urls = _presign_stems(stem_files)
+    request.session[f'stems:{base_name}'] = {
+        'signed_at': time.time(),
+        'download_urls': download_urls
+    }
+    return download_urls
 
 
 class SettingsPage(TemplateView):
@@ -55,360 +124,423 @@ class ValidateKeygen(TemplateView):
     def post(self, request):
         try:
             logger.info("==== ValidateKeygen POST triggered ====")
-            logger.info("Raw POST data: %s", request.POST)
 
             key = request.POST.get('keygen_license', '').strip()
             if not key:
                 logger.warning("Empty license key submitted")
-                return render(request, 'partials/file_upload_split.html', {
+                return _render_partial(request, {
                     'keygen_section': True,
                     'error_message': 'License key cannot be empty!'
                 })
 
-            logger.info(f"Validating key: {key}")
+            logger.info("Validating key: %s", key)
             if check_key(key):
                 try:
                     store_license_in_session(request, key)
                 except Exception as e:
-                    logger.error("Session store failed: %s", str(e))
+                    logger.error("Session store failed: %s", e)
                     return HttpResponse("Key valid but session storage failed", status=500)
 
                 try:
-                    return render(request, 'partials/file_upload_split.html', {'upload_section': True})
+                    return _render_partial(request, {'upload_section': True})
                 except Exception as render_err:
-                    logger.error("Render error: %s", str(render_err))
-                    logger.error(traceback.format_exc())
-                    return HttpResponse(f"<pre>Template render error:\n{traceback.format_exc()}</pre>", status=500)
+                    logger.exception("Render error: %s", render_err)
+                    return HttpResponse("An unexpected error occurred. Please try again.", status=500)
 
             else:
                 logger.warning("Invalid license key")
-                return render(request, 'partials/file_upload_split.html', {
+                return _render_partial(request, {
                     'keygen_section': True,
                     'error_message': 'License key is invalid. Please try again.'
                 })
 
         except Exception as e:
-            logger.error("Exception in ValidateKeygen: %s", str(e))
-            logger.error(traceback.format_exc())
-            return render(request, 'partials/file_upload_split.html', {
+            logger.exception("Exception in ValidateKeygen: %s", e)
+            return _render_partial(request, {
                 'keygen_section': True,
-                'error_message': f"Unexpected error:<br><pre>{traceback.format_exc()}</pre>"
+                'error_message': "An unexpected error occurred. Please try again."
             })
 
 
+@method_decorator(csrf_exempt, name='dispatch')
 class UploadFile(TemplateView):
-    def post(self, request):
-        try:
-            if settings.S3 is None:
+    def dispatch(self, request, *args, **kwargs):
+        # Preflight checks run before anything reads the multipart body, so rejected
+        # uploads aren't streamed in first. CSRF is enforced afterwards for the same
+        # reason: the middleware would parse request.POST (and the file) up front.
+        if request.method == 'POST':
+            if get_s3_client() is None:
                 logger.error("S3 client not initialized")
-                return render(request, 'partials/file_upload_split.html', {
+                return _render_partial(request, {
                     'error_message': 'AWS S3 connection error',
                     'upload_section': True
                 })
 
+            try:
+                content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+            except ValueError:
+                content_length = 0
+
+            if content_length > settings.MAX_UPLOAD_SIZE:
+                logger.warning("Rejected upload of %s bytes", content_length)
+                response = _render_partial(request, {
+                    'error_message': f'File is too large. Maximum size is {settings.MAX_UPLOAD_SIZE // (1024 * 1024)}MB.',
+                    'upload_section': True
+                })
+                response.status_code = 413
+                return response
+
+            # Spool every upload to disk, whatever its size, so boto3 can read it from a file
+            request.upload_handlers = [TemporaryFileUploadHandler(request)]
+
+        return csrf_protect(super().dispatch)(request, *args, **kwargs)
+
+    def post(self, request):
+        try:
             if 'file' not in request.FILES:
-                return render(request, 'partials/file_upload_split.html', {
+                return _render_partial(request, {
                     'error_message': 'No file uploaded',
                     'upload_section': True
                 })
 
             uploaded_file = request.FILES['file']
-            logger.info(f"Received file: {uploaded_file.name}")
+            logger.info("Received file: %s", uploaded_file.name)
 
-            if not uploaded_file.name.endswith(S3_EXTENSIONS):
-                return render(request, 'partials/file_upload_split.html', {
-                    'error_message': 'Unsupported file type. Must be .aif, .mp3, .flac, or .wav',
+            ext = os.path.splitext(uploaded_file.name)[1].lower()
+            if ext not in _EXT_SET:
+                return _render_partial(request, {
+                    'error_message': 'Unsupported file type. Must be .aif, .aiff, .mp3, .flac, or .wav',
                     'upload_section': True
                 })
 
-            buffer = io.BytesIO()
-            for chunk in uploaded_file.chunks():
-                buffer.write(chunk)
-            buffer.seek(0)
+            # Store the real mime type so readers don't need a HEAD to find it
+            extra_args = {
+                'ContentType': AUDIO_CONTENT_TYPES[ext],
+                'CacheControl': 'no-store'
+            }
 
-            settings.S3.put_object(
-                Bucket=settings.S3_BUCKET_NAME,
-                Key=uploaded_file.name,
-                Body=buffer.getvalue()
+            # dispatch() spools every upload to disk, so boto3 reads the file straight from there
+            s3_key = _upload_key(uploaded_file.name)
+            get_s3_client().upload_file(
+                uploaded_file.temporary_file_path(),
+                settings.S3_BUCKET_NAME,
+                s3_key,
+                ExtraArgs=extra_args,
+                Config=get_transfer_config()
             )
-            logger.info(f"Uploaded {uploaded_file.name} to S3")
+            logger.info("Uploaded %s to S3 as %s", uploaded_file.name, s3_key)
+            request.session['uploaded_file'] = s3_key
 
-            return render(request, 'partials/file_upload_split.html', {
+            return _render_partial(request, {
                 'file_name': uploaded_file.name,
                 'split_section': True
             })
 
         except Exception as e:
-            logger.error("Upload error: %s", str(e))
-            logger.error(traceback.format_exc())
-            return render(request, 'partials/file_upload_split.html', {
-                'error_message': f"Upload failed: {str(e)}",
+            logger.exception("Upload error: %s", e)
+            return _render_partial(request, {
+                'error_message': "Upload failed. Please try again.",
+                'upload_section': True
+            })
+
+
+class GetUploadURL(View):
+    """Return a presigned POST so the browser can upload straight to S3"""
+
+    def post(self, request):
+        try:
+            s3 = get_s3_client()
+            if s3 is None:
+                logger.error("S3 client not initialized")
+                return OrjsonResponse({
+                    'status': 'error',
+                    'message': 'AWS S3 connection error'
+                }, status=503)
+
+            file_name = request.POST.get('file_name', '').strip()
+            if not file_name:
+                return OrjsonResponse({
+                    'status': 'error',
+                    'message': 'Missing file name'
+                }, status=400)
+
+            ext = os.path.splitext(file_name)[1].lower()
+            if ext not in _EXT_SET:
+                return OrjsonResponse({
+                    'status': 'error',
+                    'message': 'Unsupported file type. Must be .aif, .aiff, .mp3, .flac, or .wav'
+                }, status=400)
+
+            content_type = AUDIO_CONTENT_TYPES[ext]
+            s3_key = _upload_key(file_name)
+            presigned = s3.generate_presigned_post(
+                Bucket=settings.S3_BUCKET_NAME,
+                Key=s3_key,
+                Fields={'Content-Type': content_type, 'Cache-Control': 'no-store'},
+                Conditions=[
+                    ['content-length-range', 0, settings.MAX_UPLOAD_SIZE],
+                    ['starts-with', '$Content-Type', 'audio/'],
+                    {'Cache-Control': 'no-store'},
+                ],
+                ExpiresIn=3600  # 1 hour
+            )
+            logger.info("Generated presigned upload for %s as %s", file_name, s3_key)
+            # ConfirmUpload only accepts the key issued here
+            request.session['pending_upload'] = s3_key
+
+            return OrjsonResponse({
+                'status': 'success',
+                'url': presigned['url'],
+                'fields': presigned['fields']
+            })
+
+        except Exception as e:
+            logger.exception("Error generating presigned upload: %s", e)
+            return OrjsonResponse({
+                'status': 'error',
+                'message': 'Could not prepare upload'
+            }, status=500)
+
+
+class ConfirmUpload(TemplateView):
+    """Move to the split step once the browser has uploaded the file to S3"""
+
+    def post(self, request):
+        s3_key = request.POST.get('file_name', '').strip()
+        if not s3_key or s3_key != request.session.get('pending_upload'):
+            logger.warning("Upload confirmation for unknown key: %s", s3_key)
+            return _render_partial(request, {
+                'error_message': 'Upload failed. Please try again.',
                 'upload_section': True
             })
 
+        logger.info("Browser uploaded %s to S3", s3_key)
+        request.session.pop('pending_upload', None)
+        request.session['uploaded_file'] = s3_key
+        return _render_partial(request, {
+            'file_name': os.path.basename(s3_key),
+            'split_section': True
+        })
+
 
 class SplitFile(TemplateView):
     def post(self, request):
         logger.info("=== SplitFile.post started ===")
         try:
-            # Extract and validate file name
-            file_name = request.POST.get('file_name', '')
-            if not file_name:
-                logger.error("No file_name provided in request")
-                return render(request, 'partials/file_upload_split.html', {
-                    'error_message': "Missing file name",
+            # Only the upload recorded on this session can be split (and later deleted)
+            s3_key = request.session.get('uploaded_file')
+            if not s3_key:
+                logger.error("No uploaded file on the session")
+                return _render_partial(request, {
+                    'error_message': "Please upload a file first",
                     'upload_section': True
                 })
 
-            logger.info(f"Processing split request for file: {file_name}")
+            logger.info("Processing split request for file: %s", s3_key)
 
             # Validate Beam API configuration
             if not settings.BEAM_API_URL:
                 logger.error("BEAM_API_URL not configured")
-                return render(request, 'partials/file_upload_split.html', {
+                return _render_partial(request, {
                     'error_message': "Split service not properly configured",
                     'upload_section': True
                 })
 
             if not settings.BEAM_API_TOKEN:
                 logger.error("BEAM_API_TOKEN not configured")
-                return render(request, 'partials/file_upload_split.html', {
+                return _render_partial(request, {
                     'error_message': "Split service authentication not configured",
                     'upload_section': True
                 })
 
-            # Prepare request to Beam API
-            headers = {
-                'Authorization': f"Bearer {settings.BEAM_API_TOKEN}",
-                'Content-Type': 'application/json',
-                'Accept': 'application/json'
-            }
+            # Hand the Beam call off to a Celery worker; the client polls SplitStatus
+            task = run_split.delay(s3_key, upload_key=s3_key)
+            logger.info("Queued split task %s for file: %s", task.id, s3_key)
+            # SplitStatus only reports on the task this session started
+            request.session['split_task'] = task.id
+
+            return _render_partial(request, {
+                'task_id': task.id,
+                'file_name': os.path.basename(s3_key),
+                'split_pending': True,
+                'next_poll': 1,
+                'poll_seconds': SPLIT_POLL_SECONDS
+            })
+
+        except Exception as e:
+            # Catch-all for any unexpected errors
+            logger.exception("Unexpected error in SplitFile view: %s", e)
+            return _render_partial(request, {
+                'error_message': "An unexpected error occurred. Please try again.",
+                'upload_section': True
+            })
+        finally:
+            logger.info("=== SplitFile.post completed ===")
 
-            payload = {'file_name': file_name}
-            logger.info(f"Sending request to Beam API at {settings.BEAM_API_URL}")
-            logger.info(f"Request payload: {payload}")
 
-            # Make the API request with timeout
-            try:
-                response = requests.post(
-                    settings.BEAM_API_URL,
-                    headers=headers,
-                    json=payload,
-                    timeout=300  # 5 minute timeout
-                )
-            except requests.exceptions.Timeout:
-                logger.error("Beam API request timed out after 300 seconds")
-                return render(request, 'partials/file_upload_split.html', {
-                    'error_message': "Processing timed out. Please try again or use a smaller file.",
-                    'upload_section': True
-                })
-            except requests.exceptions.ConnectionError:
-                logger.error(f"Connection error to Beam API at {settings.BEAM_API_URL}")
-                return render(request, 'partials/file_upload_split.html', {
-                    'error_message': "Could not connect to processing service. Please try again later.",
-                    'upload_section': True
-                })
-            except requests.exceptions.RequestException as e:
-                logger.error(f"Request to Beam API failed: {str(e)}")
-                return render(request, 'partials/file_upload_split.html', {
-                    'error_message': "Error communicating with processing service.",
-                    'upload_section': True
-                })
+def _store_stems(request, base_name, stem_files):
+    """Keep a finished split's stems on the session and schedule their deletion once"""
+    request.session['base_name'] = base_name
+    request.session['stem_files'] = stem_files
+    request.session['stems_delete_at'] = time.time() + STEM_RETENTION_SECONDS
+    cleanup_s3_keys.apply_async(
+        args=[[stem_file['s3_key'] for stem_file in stem_files]],
+        countdown=STEM_RETENTION_SECONDS
+    )
+    if get_s3_client() is not None:
+        _cache_stem_urls(request, base_name, stem_files)
 
-            # Process the API response
-            logger.info(f"Beam API response status code: {response.status_code}")
 
-            # For non-200 responses, try to extract meaningful error information
-            if response.status_code != 200:
-                try:
-                    error_content = response.json()
-                    logger.error(f"Beam API error response: {error_content}")
-                    error_message = f"Processing service error: {error_content.get('error', 'Unknown error')}"
-                except ValueError:
-                    # Not JSON or other parsing error
-                    logger.error(f"Beam API non-JSON error response: {response.text[:1000]}")
-                    error_message = f"Processing service error (Status: {response.status_code})"
+def _clear_stems(request):
+    """Drop the finished split's stem list and signed URLs from the session"""
+    base_name = request.session.pop('base_name', None)
+    request.session.pop('stem_files', None)
+    request.session.pop('stems_delete_at', None)
+    if base_name:
+        request.session.pop(f'stems:{base_name}', None)
+
+
+def _end_failed_split(request):
+    """Forget the session's split and delete its upload, which the worker only removes on success"""
+    request.session.pop('split_task', None)
+    s3_key = request.session.pop('uploaded_file', None)
+    if s3_key:
+        cleanup_s3_keys.delay([s3_key])
 
-                return render(request, 'partials/file_upload_split.html', {
-                    'error_message': error_message,
+
+class SplitStatus(TemplateView):
+    def get(self, request, task_id):
+        try:
+            # Task IDs show up in URLs and logs, so only the session that queued the split may read it
+            if task_id != request.session.get('split_task'):
+                logger.warning("Status requested for unknown split task %s", task_id)
+                return _render_partial(request, {
+                    'error_message': "Split not found. Please upload your file again.",
                     'upload_section': True
                 })
 
-            # Handle successful response
-            try:
-                result = response.json()
-                logger.info(f"Successfully processed file. Result: {result}")
-
-                # Check if it's the new format with base_name and stem_files
-                if 'base_name' in result and 'stem_files' in result:
-                    base_name = result['base_name']
-                    stem_files = result['stem_files']
-
-                    # Convert stem_files to JSON string
-                    stem_files_json = json.dumps(stem_files)
-
-                    # Use the original download UI but with stem files info
-                    return render(request, 'partials/file_upload_split.html', {
-                        'zip_file_name': base_name,  # This is now the base name without extension
-                        'stem_files_json': stem_files_json,  # Add stem files as JSON
-                        'download_section': True
-                    })
+            result = run_split.AsyncResult(task_id)
 
-                # If it's the old format with just a zip file
-                elif 'file_name' in result:
-                    return render(request, 'partials/file_upload_split.html', {
-                        'zip_file_name': result['file_name'],
-                        'download_section': True
-                    })
-                else:
-                    logger.error(f"Invalid response format from Beam API: {result}")
-                    return render(request, 'partials/file_upload_split.html', {
-                        'error_message': "Invalid response from processing service",
+            if not result.ready():
+                try:
+                    poll = int(request.GET.get('poll', 0))
+                except ValueError:
+                    poll = 0
+
+                # A result that never arrives (expired or lost) would otherwise be polled forever
+                if poll >= SPLIT_MAX_POLLS:
+                    logger.error("Gave up waiting for split task %s", task_id)
+                    _end_failed_split(request)
+                    return _render_partial(request, {
+                        'error_message': "Processing timed out. Please try again.",
                         'upload_section': True
                     })
 
-            except ValueError:
-                logger.error(f"Could not parse Beam API JSON response: {response.text[:1000]}")
-                return render(request, 'partials/file_upload_split.html', {
-                    'error_message': "Invalid response from processing service",
-                    'upload_section': True
+                return _render_partial(request, {
+                    'task_id': task_id,
+                    'file_name': request.GET.get('file_name', ''),
+                    'split_pending': True,
+                    'next_poll': poll + 1,
+                    'poll_seconds': SPLIT_POLL_SECONDS
                 })
 
-        except Exception as e:
-            # Catch-all for any unexpected errors
-            logger.error(f"Unexpected error in SplitFile view: {str(e)}")
-            logger.error(traceback.format_exc())
-            return render(request, 'partials/file_upload_split.html', {
-                'error_message': "An unexpected error occurred. Please try again.",
-                'upload_section': True
-            })
-        finally:
-            logger.info("=== SplitFile.post completed ===")
-
-    def generate_presigned_urls(self, stem_files):
-        """Generate presigned URLs for each stem file"""
-        stem_download_urls = []
-
-        try:
-            # Create S3 client
-            s3_client = boto3.client(
-                's3',
-                aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-                aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-                region_name="us-west-2"
-            )
+            if result.failed():
+                logger.error("Split task %s failed: %s", task_id, result.result)
+                _end_failed_split(request)
+                return _render_partial(request, {
+                    'error_message': "An unexpected error occurred. Please try again.",
+                    'upload_section': True
+                })
 
-            # Generate presigned URL for each stem file
-            for stem_file in stem_files:
-                s3_key = stem_file["s3_key"]
-                file_name = stem_file["file_name"]
+            outcome = result.get()
 
-                try:
-                    # Create a presigned URL that will work for 5 minutes
-                    presigned_url = s3_client.generate_presigned_url(
-                        'get_object',
-                        Params={
-                            'Bucket': settings.S3_BUCKET_NAME,
-                            'Key': s3_key,
-                            'ResponseContentDisposition': f'attachment; filename="{file_name}"'
-                        },
-                        ExpiresIn=300  # 5 minutes
-                    )
-
-                    stem_download_urls.append({
-                        "file_name": file_name,
-                        "download_url": presigned_url
-                    })
+            if outcome['status'] != 'success':
+                _end_failed_split(request)
+                return _render_partial(request, {
+                    'error_message': outcome['error_message'],
+                    'upload_section': True
+                })
 
-                    logger.info(f"Generated presigned URL for {file_name}")
+            # The worker deletes the original upload after a successful split
+            request.session.pop('split_task', None)
+            request.session.pop('uploaded_file', None)
+            # Only the newest split's stems are kept on the session
+            _clear_stems(request)
+
+            # New format with base_name and stem_files
+            if 'stem_files' in outcome:
+                # Keep the stem list server-side for the download and cleanup steps
+                _store_stems(request, outcome['base_name'], outcome['stem_files'])
+                return _render_partial(request, {
+                    'zip_file_name': os.path.basename(outcome['base_name']),  # This is the base name without extension
+                    'download_section': True
+                })
 
-                except Exception as e:
-                    logger.error(f"Error generating presigned URL for {s3_key}: {str(e)}")
+            # Old format with just a zip file: download it from S3 like a single stem
+            zip_file = {'s3_key': outcome['file_name'], 'file_name': outcome['file_name']}
+            _store_stems(request, outcome['file_name'], [zip_file])
+            return _render_partial(request, {
+                'zip_file_name': os.path.basename(outcome['file_name']),
+                'download_section': True
+            })
 
         except Exception as e:
-            logger.error(f"Error setting up S3 client for presigned URLs: {str(e)}")
-
-        return stem_download_urls
+            logger.exception("Unexpected error in SplitStatus view: %s", e)
+            return _render_partial(request, {
+                'error_message': "An unexpected error occurred. Please try again.",
+                'upload_section': True
+            })
 
 
 class DownloadFile(TemplateView):
     def post(self, request):
         try:
-            # Get base name from the form
-            base_name = request.POST.get('base_name')
-            stem_files_json = request.POST.get('stem_files')
+            # The stem list was stored on the session when the split finished
+            base_name = request.session.get('base_name')
+            stem_files = request.session.get('stem_files', [])
 
-            logger.info(f"Starting download of stems for: {base_name}")
+            logger.info("Starting download of stems for: %s", base_name)
 
-            if not base_name or not stem_files_json:
+            if not base_name or not stem_files:
                 logger.error("Missing required parameters for download")
-                return JsonResponse({
+                return OrjsonResponse({
                     'status': 'error',
                     'message': 'Missing stem file information'
                 }, status=400)
 
-            try:
-                stem_files = json.loads(stem_files_json)
-            except json.JSONDecodeError:
-                logger.error(f"Invalid stem files JSON: {stem_files_json}")
-                return JsonResponse({
+            # New URLs must expire before the scheduled cleanup deletes the stems
+            if time.time() + PRESIGN_EXPIRES > request.session.get('stems_delete_at', 0):
+                logger.info("Stems for %s have expired", base_name)
+                _clear_stems(request)
+                return OrjsonResponse({
                     'status': 'error',
-                    'message': 'Invalid stem file information'
-                }, status=400)
-
-            # Create S3 presigned URLs for each stem file for direct browser download
-            s3_client = boto3.client(
-                's3',
-                aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-                aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-                region_name="us-west-2"
-            )
-
-            # Prepare the list of download URLs
-            download_urls = []
-            for stem_file in stem_files:
-                s3_key = stem_file["s3_key"]
-                file_name = stem_file["file_name"]
-
-                try:
-                    # Create presigned URL
-                    presigned_url = s3_client.generate_presigned_url(
-                        'get_object',
-                        Params={
-                            'Bucket': settings.S3_BUCKET_NAME,
-                            'Key': s3_key,
-                            'ResponseContentDisposition': f'attachment; filename="{file_name}"'
-                        },
-                        ExpiresIn=300  # 5 minutes
-                    )
-
-                    download_urls.append({
-                        'url': presigned_url,
-                        'filename': file_name
-                    })
+                    'message': 'These stems have expired. Please split the file again.'
+                }, status=410)
 
-                    logger.info(f"Generated presigned URL for {file_name}")
+            if get_s3_client() is None:
+                logger.error("S3 client not initialized")
+                return OrjsonResponse({
+                    'status': 'error',
+                    'message': 'AWS S3 connection error'
+                }, status=503)
 
-                except Exception as e:
-                    logger.error(f"Error generating presigned URL for {s3_key}: {str(e)}")
-                    # Continue even if one URL generation fails
-                    download_urls.append({
-                        'url': None,
-                        'filename': file_name,
-                        'error': str(e)
-                    })
+            # Reuse the URLs signed when the split finished unless they're about to expire
+            cached = request.session.get(f'stems:{base_name}')
+            if cached and time.time() - cached['signed_at'] < PRESIGN_EXPIRES - PRESIGN_REFRESH_MARGIN:
+                download_urls = cached['download_urls']
+            else:
+                download_urls = _cache_stem_urls(request, base_name, stem_files)
 
             # Return JSON response with download URLs
-            return JsonResponse({
+            return OrjsonResponse({
                 'status': 'success',
                 'base_name': base_name,
                 'download_urls': download_urls
             })
 
         except Exception as e:
-            logger.error(f"General error in download: {str(e)}")
-            logger.error(traceback.format_exc())
-            return JsonResponse({
+            logger.exception("General error in download: %s", e)
+            return OrjsonResponse({
                 'status': 'error',
                 'message': 'Download processing error occurred'
             }, status=500)
@@ -424,74 +556,30 @@ class LogoutView(TemplateView):
 class CleanupS3View(View):
     def post(self, request):
         try:
-            # Parse the JSON data from the request
-            body = json.loads(request.body) if request.body else {}
-            stem_files_json = body.get('stem_files', '[]')
-
-            # If stem_files is a string (like from a form), try to parse it
-            if isinstance(stem_files_json, str):
-                try:
-                    stem_files = json.loads(stem_files_json)
-                except json.JSONDecodeError:
-                    logger.error(f"Could not parse stem files JSON: {stem_files_json}")
-                    return JsonResponse({
-                        'status': 'error',
-                        'message': 'Invalid stem files data'
-                    }, status=400)
-            elif isinstance(stem_files_json, list):
-                stem_files = stem_files_json
-            else:
-                logger.error(f"Unexpected stem files type: {type(stem_files_json)}")
-                return JsonResponse({
-                    'status': 'error',
-                    'message': 'Invalid stem files format'
-                }, status=400)
-
-            # Create S3 client
-            s3_client = boto3.client(
-                's3',
-                aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-                aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-                region_name="us-west-2"
-            )
-
-            # Delete each file from S3
-            deleted_files = []
-            failed_files = []
-
-            for stem_file in stem_files:
-                # Handle both dictionary and string input formats
-                s3_key = stem_file.get('s3_key', stem_file) if isinstance(stem_file, (dict, str)) else None
+            stem_files = request.session.get('stem_files', [])
 
-                if not s3_key:
-                    logger.warning(f"Skipping invalid stem file entry: {stem_file}")
-                    continue
+            # Collect keys, handling both dictionary and string input formats
+            s3_keys = [
+                key for key in (
+                    item.get('s3_key') if isinstance(item, dict) else item
+                    for item in stem_files
+                )
+                if key and isinstance(key, str)
+            ]
 
-                try:
-                    s3_client.delete_object(
-                        Bucket=settings.S3_BUCKET_NAME,
-                        Key=s3_key
-                    )
-                    deleted_files.append(s3_key)
-                    logger.info(f"Deleted {s3_key} from S3")
-                except Exception as e:
-                    logger.error(f"Error deleting {s3_key} from S3: {str(e)}")
-                    failed_files.append({
-                        's3_key': s3_key,
-                        'error': str(e)
-                    })
+            # Delete in the background so the response doesn't wait on S3
+            cleanup_s3_keys.delay(s3_keys)
+            _clear_stems(request)
 
-            return JsonResponse({
+            return OrjsonResponse({
                 'status': 'success',
-                'message': f'Processed {len(stem_files)} files',
-                'deleted_files': deleted_files,
-                'failed_files': failed_files
+                'message': f'Scheduled cleanup of {len(s3_keys)} files',
+                'queued_files': s3_keys
             })
 
         except Exception as e:
-            logger.error(f"Unexpected error in S3 cleanup: {str(e)}")
-            logger.error(traceback.format_exc())
-            return JsonResponse({
+            logger.exception("Unexpected error in S3 cleanup: %s", e)
+            return OrjsonResponse({
                 'status': 'error',
                 'message': 'Unexpected error during cleanup'
             }, status=500)
\ No newline at end of file
@@ -0,0 +1,17 @@
+"""
+Celery application for splitter_django.
+
+Long-running work (the Beam split call) runs in a Celery worker so web
+requests return immediately. Configuration is read from Django settings
+using the CELERY_ prefix.
+"""
+
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'splitter_django.settings')
+
+app = Celery('splitter_django')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
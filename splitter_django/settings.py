@@ -4,32 +4,42 @@ Django settings for splitter_django project - simplified for Fly.io deployment.
 
 import os
 from pathlib import Path
-from dotenv import load_dotenv
-import logging
-
-# Load environment variables from .env file (if present)
-load_dotenv()
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
-# Configure simple logging
-logger = logging.getLogger("general_logger")
-logger.setLevel(os.getenv("LOG_LEVEL", "INFO"))
-handler = logging.StreamHandler()
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-handler.setFormatter(formatter)
-logger.addHandler(handler)
-logger.propagate = False
+# Load environment variables from .env file (if present); production sets them directly
+if os.getenv("DJANGO_LOAD_DOTENV", "1") == "1" and (BASE_DIR / '.env').exists():
+    from dotenv import load_dotenv
+    load_dotenv(BASE_DIR / '.env')
+
+# Configure simple logging (applied once by django.setup(), which replaces handlers)
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'default': {'format': '%(asctime)s - %(name)s - %(levelname)s - %(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'default'},
+    },
+    'loggers': {
+        'general_logger': {
+            'handlers': ['console'],
+            'level': os.getenv('LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
+}
 
 # SECURITY SETTINGS
 SECRET_KEY = os.getenv("SECRET_KEY", "django-insecure-default-key-for-development")
 DEBUG = os.getenv("DEBUG", "False").lower() == "true"
-ALLOWED_HOSTS = ['localhost', '127.0.0.1', '.fly.dev', 'www.songsplit.net', 'songsplit.net',]
+ALLOWED_HOSTS = ('localhost', '127.0.0.1', '.fly.dev', 'www.songsplit.net', 'songsplit.net',)
 """ALLOWED_HOSTS = ['*']"""
 
 # Application definition
-INSTALLED_APPS = [
+INSTALLED_APPS = (
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -39,9 +49,9 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     # Custom apps
     'splitter.apps.SplitterConfig',
-]
+)
 
-MIDDLEWARE = [
+MIDDLEWARE = (
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # Add whitenoise middleware
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -52,7 +62,7 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     # Custom middleware - commented out for initial deployment testing
     # 'splitter.middleware.LicenseMiddleware',
-]
+)
 
 ROOT_URLCONF = 'splitter_django.urls'
 
@@ -81,7 +91,9 @@ DATABASES = {
         #'NAME': BASE_DIR / 'db.sqlite3',
         # THIS IS THE SAVED VOLUME IN FLY.IO
         'NAME': '/data/db.sqlite3',
-
+        # Keep each worker's connection open; a cheap liveness check runs before reuse
+        'CONN_MAX_AGE': None,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
@@ -101,24 +113,44 @@ USE_TZ = True
 
 # Static files (CSS, JavaScript, Images)
 STATIC_URL = '/static/'
-STATIC_ROOT = BASE_DIR / 'staticfiles'
-STATICFILES_DIRS = [
-    BASE_DIR / 'static',
-]
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+STATIC_ROOT = str(BASE_DIR / 'staticfiles')
+# Only existing directories, so the finders never probe a missing path
+STATICFILES_DIRS = tuple(str(p) for p in (BASE_DIR / 'static',) if p.is_dir())
+# Compressed copies are built by collectstatic in the image; no manifest is parsed at boot
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'whitenoise.storage.CompressedStaticFilesStorage'},
+}
 
 # Media files
 MEDIA_URL = '/media/'
-MEDIA_ROOT = BASE_DIR / 'media'
+MEDIA_ROOT = str(BASE_DIR / 'media')
 
 # File upload size limit
 DATA_UPLOAD_MAX_MEMORY_SIZE = 100 * 1024 * 1024  # 100MB
+# Largest file the browser may upload directly to S3
+MAX_UPLOAD_SIZE = 500 * 1024 * 1024  # 500MB
+# Where spooled uploads are written; point SPLITTER_TMP at a tmpfs (e.g. /dev/shm/splitter) to skip the disk
+FILE_UPLOAD_TEMP_DIR = os.getenv('SPLITTER_TMP') or None
 
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-# Simple session configuration
-SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+# Cache - Redis, shared with the Celery broker
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+        'OPTIONS': {
+            'max_connections': 50,
+        },
+    }
+}
+
+# Sessions are stored in the cache to avoid a database round-trip per request
+SESSION_ENGINE = 'django.contrib.sessions.backends.cache'
+SESSION_CACHE_ALIAS = 'default'
 SESSION_COOKIE_AGE = 86400  # 24 hours
 
 # External service configurations - initialized as None by default
@@ -126,36 +158,27 @@ S3_BUCKET_NAME = os.getenv('S3_BUCKET_NAME')
 BEAM_API_URL = os.getenv('BEAM_API_URL')
 BEAM_API_TOKEN = os.getenv('BEAM_API_TOKEN')
 KEYGEN_ACCOUNT_ID = os.getenv('KEYGEN_ACCOUNT_ID')
-
-# Initialize S3 client (using a function to defer initialization)
-S3 = None
-def get_s3_client():
-    global S3
-    if S3 is None and os.getenv("AWS_ACCESS_KEY_ID") and os.getenv("AWS_SECRET_ACCESS_KEY"):
-        try:
-            import boto3
-            S3 = boto3.client(
-                's3',
-                aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
-                aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
-                region_name="us-west-2"
-            )
-            logger.info("Successfully initialized S3 client")
-        except Exception as e:
-            logger.error(f"Error initializing S3 client: {str(e)}")
-    return S3
+AWS_ACCESS_KEY_ID = os.getenv('AWS_ACCESS_KEY_ID')
+AWS_SECRET_ACCESS_KEY = os.getenv('AWS_SECRET_ACCESS_KEY')
+AWS_REGION = 'us-west-2'
+# Route S3 traffic over the edge network (Transfer Acceleration must be enabled on the bucket)
+S3_USE_ACCELERATE = os.getenv('S3_USE_ACCELERATE', 'False').lower() == 'true'
+
+# Celery - split jobs run in a background worker with Redis as the broker
+CELERY_BROKER_URL = REDIS_URL
+CELERY_RESULT_BACKEND = REDIS_URL
+CELERY_RESULT_EXPIRES = 3600  # 1 hour
+CELERY_TASK_TIME_LIMIT = 600  # 10 minutes; run_split sets its own limit from the Beam timeouts
+# Must exceed the task time limit so a running split isn't redelivered
+CELERY_BROKER_TRANSPORT_OPTIONS = {'visibility_timeout': 3600}
 
 # Basic security settings for production
-if not DEBUG:
-    SECURE_SSL_REDIRECT = True
-    SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
-    SESSION_COOKIE_SECURE = True
-    CSRF_COOKIE_SECURE = True
-    SECURE_BROWSER_XSS_FILTER = True
-    SECURE_CONTENT_TYPE_NOSNIFF = True
-    X_FRAME_OPTIONS = 'DENY'
+SECURE_SSL_REDIRECT = not DEBUG
+SECURE_PROXY_SSL_HEADER = None if DEBUG else ('HTTP_X_FORWARDED_PROTO', 'https')
+SESSION_COOKIE_SECURE = not DEBUG
+CSRF_COOKIE_SECURE = not DEBUG
+SECURE_CONTENT_TYPE_NOSNIFF = True
+X_FRAME_OPTIONS = 'DENY'
 
 # Allow Fly.io origin for CSRF in dev
-CSRF_TRUSTED_ORIGINS = ['https://splitter-app.fly.dev']
-
-S3 = get_s3_client()
\ No newline at end of file
+CSRF_TRUSTED_ORIGINS = ('https://splitter-app.fly.dev',)
@@ -14,31 +14,55 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-import os
+from functools import lru_cache
+from pathlib import Path
 from django.http import HttpResponse
 from django.contrib import admin
 from django.urls import path
-from django.urls import re_path
 from django.urls import include
-from django.views.generic import RedirectView
+from django.urls import register_converter
 
 from django.conf import settings
 from django.conf.urls.static import static
 
+CHALLENGE_DIR = Path('/var/www/html/.well-known/acme-challenge')
+
+
+class AcmeTokenConverter:
+    """ACME challenge tokens are base64url strings"""
+    regex = '[A-Za-z0-9_-]+'
+
+    def to_python(self, value):
+        return value
+
+    def to_url(self, value):
+        return value
+
+
+register_converter(AcmeTokenConverter, 'acme')
+
+
+@lru_cache(maxsize=32)
+def _read_challenge(challenge_file, mtime_ns):
+    """Read a challenge file; keyed on mtime so a rewritten file is read again"""
+    return (CHALLENGE_DIR / challenge_file).read_bytes()
+
+
 def acme_challenge(request, challenge_file):
     """Serve ACME challenge files for Let's Encrypt."""
-    challenge_dir = '/var/www/html/.well-known/acme-challenge'
     try:
-        with open(os.path.join(challenge_dir, challenge_file), 'r') as f:
-            content = f.read()
-        return HttpResponse(content, content_type='text/plain')
+        mtime_ns = (CHALLENGE_DIR / challenge_file).stat().st_mtime_ns
+        content = _read_challenge(challenge_file, mtime_ns)
     except FileNotFoundError:
         return HttpResponse("File not found", status=404)
+    return HttpResponse(content, content_type='text/plain')
 
 urlpatterns = [
-    re_path(r'^\.well-known/acme-challenge/(?P<challenge_file>.+)$', acme_challenge, name='acme_challenge'),
+    path('.well-known/acme-challenge/<acme:challenge_file>', acme_challenge, name='acme_challenge'),
     path('admin/', admin.site.urls),
     path('', include('splitter.urls')),
-    path('', RedirectView.as_view(url='home/', permanent=False))
-    
-] + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
+]
+
+# WhiteNoise serves static files in production
+if settings.DEBUG:
+    urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
@@ -0,0 +1,75 @@
+// Direct-to-S3 upload script
+(function() {
+    function getCsrfToken() {
+        return document.querySelector('[name=csrfmiddlewaretoken]').value;
+    }
+
+    // Fall back to uploading through Django (UploadFile view)
+    function uploadThroughServer(form) {
+        form.dataset.directUpload = 'off';
+        htmx.trigger(form, 'submit');
+    }
+
+    function directUpload(form, file) {
+        console.log('Starting direct upload for:', file.name);
+
+        // Ask Django for a presigned POST policy
+        fetch(form.dataset.uploadUrl, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/x-www-form-urlencoded',
+                'X-Requested-With': 'XMLHttpRequest',
+                'X-CSRFToken': getCsrfToken()
+            },
+            body: new URLSearchParams({ file_name: file.name })
+        })
+        .then(response => {
+            if (!response.ok) {
+                throw new Error(`Presign failed with status: ${response.status}`);
+            }
+            return response.json();
+        })
+        .then(data => {
+            // Send the file straight to S3 using the returned policy fields
+            const formData = new FormData();
+            Object.entries(data.fields).forEach(([key, value]) => {
+                formData.append(key, value);
+            });
+            formData.append('file', file);
+
+            return fetch(data.url, { method: 'POST', body: formData })
+                .then(response => {
+                    if (!response.ok) {
+                        throw new Error(`S3 upload failed with status: ${response.status}`);
+                    }
+                    return data.fields.key;
+                });
+        })
+        .then(key => {
+            // Let Django move the UI on to the split step
+            const confirmForm = document.getElementById('confirmUploadForm');
+            document.getElementById('uploaded_file_name').value = key;
+            htmx.trigger(confirmForm, 'submit');
+        })
+        .catch(error => {
+            console.error('Direct upload failed, uploading through server:', error);
+            uploadThroughServer(form);
+        });
+    }
+
+    // Intercept the HTMX upload request and send the file to S3 instead
+    document.body.addEventListener('htmx:beforeRequest', function(event) {
+        const form = event.detail.elt;
+        if (form.id !== 'fileUploadForm' || form.dataset.directUpload === 'off') {
+            return;
+        }
+
+        const fileInput = document.getElementById('fileInput');
+        if (!fileInput || fileInput.files.length === 0) {
+            return;
+        }
+
+        event.preventDefault();
+        directUpload(form, fileInput.files[0]);
+    });
+})();
@@ -22,7 +22,6 @@
 
             // Get form data
             const baseName = document.getElementById('zip_file_name').value;
-            const stemFilesInput = document.getElementById('stem_files');
 
             console.log('Initiating download for:', baseName);
 
@@ -35,8 +34,7 @@
                     'X-CSRFToken': document.querySelector('[name=csrfmiddlewaretoken]').value
                 },
                 body: new URLSearchParams({
-                    base_name: baseName,
-                    stem_files: stemFilesInput.value
+                    base_name: baseName
                 })
             })
             .then(response => {
@@ -66,7 +64,7 @@
             })
             .then((totalUrls) => {
                 // Cleanup S3 files after downloads
-                return cleanupS3Files(stemFilesInput.value);
+                return cleanupS3Files();
             })
             .then(() => {
                 // Redirect to home page
@@ -134,15 +132,15 @@
         });
     }
 
-    // Cleanup S3 files function
-    function cleanupS3Files(stemFilesJson) {
+    // Cleanup S3 files function (the server reads the stem list from the session)
+    function cleanupS3Files() {
         return fetch('/cleanup_s3/', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
                 'X-CSRFToken': document.querySelector('[name=csrfmiddlewaretoken]').value
             },
-            body: JSON.stringify({ stem_files: stemFilesJson })
+            body: JSON.stringify({})
         })
         .then(response => response.json())
         .then(data => {
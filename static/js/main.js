@@ -61,6 +61,14 @@ function setupHtmxEvents() {
     }
   });
 
+  // Swap "413 Payload Too Large" responses so the upload error message is shown
+  document.body.addEventListener('htmx:beforeSwap', function(event) {
+    if (event.detail.xhr.status === 413) {
+      event.detail.shouldSwap = true;
+      event.detail.isError = false;
+    }
+  });
+
   // After content is swapped
   document.body.addEventListener('htmx:afterSwap', function(event) {
     // If we get to the download step from the split step, hide the processing animation